@@ -7,19 +7,38 @@ Phase 2: Generate lockfile from populated caches with SHA256 hashes
 """
 
 import argparse
+import base64
 import hashlib
 import json
+import mmap
 import os
 import shutil
+import stat
 import subprocess
 import sys
 import tempfile
+from collections import deque
+from collections.abc import Iterator
+from concurrent.futures import Future, ThreadPoolExecutor
 from pathlib import Path
+from typing import TextIO
 
-NIX_BASE32_ALPHABET = "0123456789abcdfghijklmnpqrsvwxyz"
-HASH_READ_CHUNK_SIZE = 65536
+NIX_BASE32_ALPHABET = b"0123456789abcdfghijklmnpqrsvwxyz"
+# Files up to this size are hashed from a single read(), larger ones through mmap
+HASH_SINGLE_READ_MAX_SIZE = 128 * 1024
 COURSIER_ARTIFACT_SUFFIXES = (".jar", ".pom", ".xml")
-MAVEN_METADATA_FILE_NAME = "maven-metadata.xml"
+IVY_ARTIFACT_SUFFIXES = (".jar", ".pom")
+# maven-metadata.xml plus per-repository variants such as maven-metadata-central.xml
+MAVEN_METADATA_FILE_PREFIX = "maven-metadata"
+# Hashing releases the GIL for the whole file, so threads overlap both CPU and disk waits
+HASH_WORKERS = (os.cpu_count() or 1) * 2
+CS_FETCH_WORKERS = 8
+DISCOVERY_WORKERS = 8
+PARALLEL_DISCOVERY_MIN_HOSTS = 4
+FAILED_OUTPUT_TAIL_LINES = 200
+
+_MADV_SEQUENTIAL = getattr(mmap, "MADV_SEQUENTIAL", None)
+_RFC4648_TO_NIX_BASE32 = bytes.maketrans(b"ABCDEFGHIJKLMNOPQRSTUVWXYZ234567", NIX_BASE32_ALPHABET)
 
 
 class SbtRun:
@@ -112,56 +131,99 @@ def log(message: str) -> None:
 
 def _nix_base32(digest: bytes) -> str:
     """Encode raw digest bytes using Nix's little-endian base32 alphabet."""
-    value = int.from_bytes(digest, "little")
-
-    encoded_reversed = []
-    while value > 0:
-        value, remainder = divmod(value, 32)
-        encoded_reversed.append(NIX_BASE32_ALPHABET[remainder])
-
+    # Nix base32 writes the digest, read as a little-endian integer, most significant
+    # 5-bit group first. That is standard base32 of the integer's big-endian bytes, so
+    # pad to whole 40-bit blocks, let b32encode do the work and swap in the alphabet.
     target_length = (len(digest) * 8 + 4) // 5  # ceil(bits / 5)
-    encoded = "".join(reversed(encoded_reversed)).rjust(target_length, NIX_BASE32_ALPHABET[0])
-    return encoded
+    block_bytes = -(-target_length // 8) * 5
+    value = int.from_bytes(digest, "little").to_bytes(block_bytes, "big")
+    encoded = base64.b32encode(value).translate(_RFC4648_TO_NIX_BASE32)
+    return encoded[len(encoded) - target_length:].decode("ascii")
 
 
-def compute_sha256(path: Path) -> str:
+def compute_sha256(path: Path | str) -> str:
     """Compute nix-compatible SHA256 hash (base32) for a regular file."""
-    resolved = path.resolve(strict=True)
-    if not resolved.is_file():
-        raise ValueError(f"Expected file for hashing, got: {resolved}")
+    with open(path, "rb", buffering=0) as artifact:
+        # Check the opened file itself rather than resolving and stat-ing the path first
+        st = os.fstat(artifact.fileno())
+        if not stat.S_ISREG(st.st_mode):
+            raise ValueError(f"Expected file for hashing, got: {path}")
+
+        if st.st_size > HASH_SINGLE_READ_MAX_SIZE:
+            # Feed the whole file to the hasher in one update, straight from the page cache
+            with mmap.mmap(artifact.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+                if _MADV_SEQUENTIAL is not None:
+                    # The hasher reads front to back; let the kernel read ahead aggressively
+                    mapped.madvise(_MADV_SEQUENTIAL)
+                digest = hashlib.sha256(mapped).digest()
+        else:
+            # Small files (most POMs) are cheaper to read in one go than to map
+            digest = hashlib.sha256(artifact.read()).digest()
+
+    return _nix_base32(digest)
 
-    hasher = hashlib.sha256()
-    with resolved.open("rb") as artifact:
-        for chunk in iter(lambda: artifact.read(HASH_READ_CHUNK_SIZE), b""):
-            hasher.update(chunk)
 
-    return _nix_base32(hasher.digest())
+def _walk_files(directory: Path | str, suffixes: tuple[str, ...]) -> Iterator[os.DirEntry]:
+    """Recursively yield entries for files under directory whose name ends with one of suffixes.
 
+    Uses os.scandir directly: names are matched as plain strings and file types come
+    from the cached directory entry, so no Path objects or extra stat calls are needed.
+    """
+    with os.scandir(directory) as entries:
+        for entry in entries:
+            if entry.is_dir(follow_symlinks=False):
+                yield from _walk_files(entry.path, suffixes)
+            elif entry.name.endswith(suffixes) and entry.is_file():
+                yield entry
 
-def find_coursier_artifacts(cache_dir: Path) -> list[Path]:
-    """Find all artifacts in Coursier cache."""
-    artifacts = []
 
+def coursier_https_dirs(cache_dir: Path) -> list[Path]:
+    """Return the directories Coursier stores https downloads under."""
     # Coursier uses cache_dir/cache/https/... or cache_dir/https/...
-    https_dirs = [
+    return [
         cache_dir / "cache" / "https",
         cache_dir / "https",
     ]
 
-    for https_dir in https_dirs:
+
+def _is_maven_metadata(name: str) -> bool:
+    """Check whether a file is Maven repository metadata rather than an artifact."""
+    return name.startswith(MAVEN_METADATA_FILE_PREFIX) and name.endswith(".xml")
+
+
+def _iter_artifacts_under(directory: str) -> Iterator[str]:
+    """Yield artifacts in one subtree of the Coursier cache as the walk finds them."""
+    # Include Maven artifacts (.jar, .pom) and Ivy artifacts (.xml for ivy.xml)
+    for entry in _walk_files(directory, COURSIER_ARTIFACT_SUFFIXES):
+        if not _is_maven_metadata(entry.name):
+            yield entry.path
+
+
+def _find_artifacts_under(directory: str) -> list[str]:
+    """Find artifacts in one subtree of the Coursier cache."""
+    return list(_iter_artifacts_under(directory))
+
+
+def iter_coursier_artifacts(cache_dir: Path) -> Iterator[str]:
+    """Yield all artifacts in Coursier cache as they are found (the lockfile is sorted by URL)."""
+    for https_dir in coursier_https_dirs(cache_dir):
         if not https_dir.exists():
             continue
 
-        for path in https_dir.rglob("*"):
-            # Include Maven artifacts (.jar, .pom) and Ivy artifacts (.xml for ivy.xml)
-            if not path.is_file():
-                continue
-            if path.name == MAVEN_METADATA_FILE_NAME:
-                continue
-            if path.suffix in COURSIER_ARTIFACT_SUFFIXES:
-                artifacts.append(path)
+        # Each repository host (repo1.maven.org, ...) is an independent subtree
+        with os.scandir(https_dir) as entries:
+            hosts = [entry.path for entry in entries if entry.is_dir(follow_symlinks=False)]
 
-    return sorted(artifacts)
+        # Walking hosts concurrently overlaps directory reads (notably on network
+        # storage), but only pays for the pool with more than a few hosts
+        if len(hosts) > PARALLEL_DISCOVERY_MIN_HOSTS:
+            with ThreadPoolExecutor(max_workers=DISCOVERY_WORKERS) as executor:
+                for host_artifacts in executor.map(_find_artifacts_under, hosts):
+                    yield from host_artifacts
+        else:
+            # Lazily, so hashing starts while the (usually single, large) host is walked
+            for host in hosts:
+                yield from _iter_artifacts_under(host)
 
 
 def assert_no_ivy_artifacts(ivy_cache: Path) -> None:
@@ -169,11 +231,12 @@ def assert_no_ivy_artifacts(ivy_cache: Path) -> None:
     if not ivy_cache.exists():
         return
 
-    artifacts = list(ivy_cache.rglob("*.jar")) + list(ivy_cache.rglob("*.pom"))
-    if artifacts:
+    # Any single artifact is enough to fail, so stop the walk at the first one
+    artifact = next(_walk_files(ivy_cache, IVY_ARTIFACT_SUFFIXES), None)
+    if artifact is not None:
         raise AssertionError(
-            f"Found {len(artifacts)} Ivy artifacts, but modern sbt should use Coursier only. "
-            f"First artifact: {artifacts[0]}"
+            f"Found Ivy artifacts, but modern sbt should use Coursier only. "
+            f"First artifact: {artifact.path}"
         )
 
 
@@ -196,104 +259,171 @@ def find_compiler_bridges(cache_dir: Path) -> list[tuple[str, str]]:
     return bridges
 
 
-def fetch_bridge_sources(cache_dir: Path, bridges: list[tuple[str, str]], env: dict) -> None:
-    """Fetch compiler-bridge sources and dependencies using coursier CLI.
+def _run_streaming(
+    cmd: list[str], env: dict, cwd: Path, log_marker: str | None = None
+) -> tuple[int, list[str]]:
+    """Run a command, consuming its combined stdout/stderr line by line.
 
-    sbt compiles the compiler-bridge from sources but doesn't cache the sources jar
-    in the coursier cache. We need to explicitly fetch them for offline builds.
-    We also fetch main artifacts since sources have transitive dependencies.
+    Lines containing log_marker are logged as they arrive. Only the last
+    FAILED_OUTPUT_TAIL_LINES lines are kept (for failure reports), so memory use
+    doesn't grow with the amount of output.
     """
-    if not bridges:
-        return
+    tail: deque[str] = deque(maxlen=FAILED_OUTPUT_TAIL_LINES)
+    with subprocess.Popen(
+        cmd,
+        env=env,
+        cwd=cwd,
+        stdout=subprocess.PIPE,
+        stderr=subprocess.STDOUT,
+        text=True,
+    ) as proc:
+        for line in proc.stdout:
+            line = line.rstrip("\n")
+            if log_marker is not None and log_marker in line:
+                log(f"[info] {line.strip()}")
+            tail.append(line)
 
-    log("=== Fetching compiler-bridge sources ===")
+    return proc.returncode, list(tail)
 
-    for scala_ver, bridge_ver in bridges:
-        coord = f"org.scala-sbt:compiler-bridge_{scala_ver}:{bridge_ver}"
-        log(f"  Fetching sources and deps for {coord}")
 
-        # First fetch main artifacts (transitive dependencies)
-        result = subprocess.run(
-            ["cs", "fetch", coord],
-            env={**env, "COURSIER_CACHE": str(cache_dir)},
-            capture_output=True,
-            text=True,
-        )
+def run_sbt(sbt_run: SbtRun, env: dict, project_dir: Path) -> None:
+    """Run a single configured sbt invocation, raising RuntimeError on failure."""
+    cmd = ["sbt", "--batch"] + sbt_run.args
+    # Launcher messages are logged as they arrive
+    returncode, output = _run_streaming(cmd, env, project_dir, log_marker="[launcher]")
+    if returncode != 0:
+        log("sbt failed:\n" + "\n".join(output))
+        raise RuntimeError(f"sbt command failed: {' '.join(cmd)}")
 
-        if result.returncode != 0:
-            log(f"  Warning: Failed to fetch deps for {coord}: {result.stderr}")
 
-        # Then fetch sources
-        result = subprocess.run(
-            ["cs", "fetch", "--sources", coord],
-            env={**env, "COURSIER_CACHE": str(cache_dir)},
-            capture_output=True,
-            text=True,
-        )
+def _run_cs_fetch(coord: str, fetch_env: dict, options: list[str] | None = None) -> subprocess.CompletedProcess:
+    """Fetch a single coord with `cs fetch`.
 
-        if result.returncode != 0:
-            log(f"  Warning: Failed to fetch sources for {coord}: {result.stderr}")
-        else:
-            # Log the fetched source files
-            for line in result.stdout.strip().split('\n'):
-                if line and 'sources' in line:
-                    log(f"    {line}")
+    fetch_env must already point COURSIER_CACHE at the target cache. Each root
+    coord gets its own resolution: coursier keeps one version per module within
+    a resolution, so fetching coords together would drop the other versions.
+    Only stderr is captured, the list of fetched files on stdout is discarded.
+    """
+    return subprocess.run(
+        ["cs", "fetch", *(options or []), coord],
+        env=fetch_env,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.PIPE,
+        text=True,
+    )
 
 
-def fetch_configured_artifacts(
-    cache_dir: Path, fetch_artifacts: list[ArtifactFetch], env: dict
+def fetch_extra_artifacts(
+    cache_dir: Path,
+    bridges: list[tuple[str, str]],
+    fetch_artifacts: list[ArtifactFetch],
+    env: dict,
 ) -> None:
-    """Fetch explicitly configured artifacts with optional classifiers."""
-    if not fetch_artifacts:
-        return
+    """Fetch compiler-bridge sources and explicitly configured artifacts using coursier CLI.
 
-    log("=== Fetching configured artifacts ===")
+    sbt compiles the compiler-bridge from sources but doesn't cache the sources jar
+    in the coursier cache. We need to explicitly fetch them for offline builds.
+    We also fetch main artifacts since sources have transitive dependencies.
 
-    for artifact in fetch_artifacts:
-        log(f"  Fetching {artifact.coord}")
+    Every cs invocation starts a JVM, so the per-coord fetches run concurrently on
+    one bounded pool. Each fetch is logged when submitted, its result as it completes.
+    """
+    if not bridges and not fetch_artifacts:
+        return
 
-        # Fetch main artifact and transitive dependencies
-        result = subprocess.run(
-            ["cs", "fetch", artifact.coord],
-            env={**env, "COURSIER_CACHE": str(cache_dir)},
-            capture_output=True,
-            text=True,
-        )
+    fetch_env = {**env, "COURSIER_CACHE": str(cache_dir)}
+
+    with ThreadPoolExecutor(max_workers=CS_FETCH_WORKERS) as executor:
+        bridge_fetches = []
+        if bridges:
+            log("=== Fetching compiler-bridge sources ===")
+        for scala_ver, bridge_ver in bridges:
+            coord = f"org.scala-sbt:compiler-bridge_{scala_ver}:{bridge_ver}"
+            log(f"  Fetching sources and deps for {coord}")
+            # Main artifacts (transitive dependencies) and sources are independent
+            # resolutions, so both run concurrently
+            bridge_fetches.append((
+                coord,
+                executor.submit(_run_cs_fetch, coord, fetch_env),
+                executor.submit(_run_cs_fetch, coord, fetch_env, ["--sources"]),
+            ))
+
+        artifact_fetches = []
+        if fetch_artifacts:
+            log("=== Fetching configured artifacts ===")
+        for artifact in fetch_artifacts:
+            log(f"  Fetching {artifact.coord}")
+            main_fetch = executor.submit(_run_cs_fetch, artifact.coord, fetch_env)
+            # Each classifier (e.g., sources, javadoc) separately
+            classifier_fetches = []
+            for classifier in artifact.classifiers:
+                log(f"    Fetching classifier: {classifier}")
+                classifier_fetches.append((
+                    classifier,
+                    executor.submit(_run_cs_fetch, artifact.coord, fetch_env, [f"--classifier={classifier}"]),
+                ))
+            artifact_fetches.append((artifact.coord, main_fetch, classifier_fetches))
+
+        for coord, main_fetch, sources_fetch in bridge_fetches:
+            result = main_fetch.result()
+            if result.returncode != 0:
+                log(f"  Warning: Failed to fetch {coord}: {result.stderr}")
+            result = sources_fetch.result()
+            if result.returncode != 0:
+                log(f"  Warning: Failed to fetch sources for {coord}: {result.stderr}")
+            else:
+                log(f"    Fetched sources for {coord}")
 
-        if result.returncode != 0:
-            log(f"  Warning: Failed to fetch {artifact.coord}: {result.stderr}")
+        for coord, main_fetch, classifier_fetches in artifact_fetches:
+            result = main_fetch.result()
+            if result.returncode != 0:
+                log(f"  Warning: Failed to fetch {coord}: {result.stderr}")
+            for classifier, classifier_fetch in classifier_fetches:
+                result = classifier_fetch.result()
+                if result.returncode != 0:
+                    log(f"    Warning: Failed to fetch {classifier} for {coord}: {result.stderr}")
+                else:
+                    log(f"      Fetched {classifier} for {coord}")
 
-        # Fetch each classifier (e.g., sources, javadoc)
-        for classifier in artifact.classifiers:
-            log(f"    Fetching classifier: {classifier}")
-            result = subprocess.run(
-                ["cs", "fetch", f"--classifier={classifier}", artifact.coord],
-                env={**env, "COURSIER_CACHE": str(cache_dir)},
-                capture_output=True,
-                text=True,
-            )
 
-            if result.returncode != 0:
-                log(f"    Warning: Failed to fetch {classifier} for {artifact.coord}: {result.stderr}")
-            else:
-                for line in result.stdout.strip().split('\n'):
-                    if line:
-                        log(f"      {line}")
+def https_path_prefixes(cache_dir: Path) -> tuple[str, ...]:
+    """Return the path prefixes stripped by path_to_url, computed once per cache."""
+    return tuple(str(https_dir) + os.sep for https_dir in coursier_https_dirs(cache_dir))
 
 
-def path_to_url(path: Path, cache_dir: Path) -> str:
+def path_to_url(path: str, https_prefixes: tuple[str, ...]) -> str:
     """Convert cache path to URL."""
     # Path structure: cache_dir/[cache/]https/repo.example.com/path/to/artifact
-    relative = path.relative_to(cache_dir)
-    parts = relative.parts
+    for prefix in https_prefixes:
+        if path.startswith(prefix):
+            return "https://" + path[len(prefix):].replace(os.sep, "/")
+
+    raise ValueError(f"Unexpected path structure (no 'https'): {path}")
 
-    # Find 'https' in path and take everything after it
+
+def _delete_in_background(directory: Path, executor: ThreadPoolExecutor) -> Future[None]:
+    """Move directory out of the way with a rename, then delete it on executor."""
+    # A fresh sibling keeps the rename on the same filesystem and never collides
+    graveyard = Path(tempfile.mkdtemp(prefix=_graveyard_prefix(directory), dir=directory.parent))
     try:
-        https_idx = parts.index("https")
-        url_parts = parts[https_idx + 1:]
-        return "https://" + "/".join(url_parts)
-    except ValueError:
-        raise ValueError(f"Unexpected path structure (no 'https'): {path}")
+        directory.rename(graveyard / directory.name)
+    except OSError:
+        graveyard.rmdir()
+        raise
+    return executor.submit(shutil.rmtree, graveyard)
+
+
+def _graveyard_prefix(directory: Path) -> str:
+    """Name prefix of the siblings _delete_in_background moves directory into."""
+    return f".{directory.name}.deleting."
+
+
+def _delete_stale_graveyards(directory: Path, executor: ThreadPoolExecutor) -> list[Future[None]]:
+    """Delete siblings left behind by an earlier run that was interrupted mid-deletion."""
+    return [
+        executor.submit(shutil.rmtree, stale, ignore_errors=True)
+        for stale in directory.parent.glob(f"{_graveyard_prefix(directory)}*")
+    ]
 
 
 def generate_lockfile(project_dir: Path, config: Config, keep_temp: bool = False) -> dict:
@@ -347,55 +477,57 @@ def _generate_lockfile_impl(project_dir: Path, config: Config, temp_home: Path)
 
     # Clean target directories
     log("Cleaning target directory...")
-    target_dir = project_dir / "target"
-    project_target = project_dir / "project" / "target"
-    if target_dir.exists():
-        shutil.rmtree(target_dir)
-    if project_target.exists():
-        shutil.rmtree(project_target)
+    target_dirs = [
+        project_dir / "target",
+        project_dir / "project" / "target",
+    ]
+    # A rename is instant, so move the trees aside and delete them while sbt runs
+    cleanup_executor = ThreadPoolExecutor(max_workers=len(target_dirs))
+    # Stale siblings are collected before this run adds its own
+    cleanups = [cleanup for d in target_dirs for cleanup in _delete_stale_graveyards(d, cleanup_executor)]
+    cleanups += [_delete_in_background(d, cleanup_executor) for d in target_dirs if d.exists()]
+    cleanup_executor.shutdown(wait=False)
+
+    try:
+        entries = _populate_and_hash(project_dir, config, temp_home, coursier_cache, env)
+    finally:
+        # The trees were already renamed out of the way, so a failed deletion must not
+        # discard the lockfile (or mask a phase 1 error); just report it
+        for cleanup in cleanups:
+            if cleanup.exception() is not None:
+                log(f"Warning: Failed to delete old target directory: {cleanup.exception()}")
+
+    log(f"=== Done! Processed {len(entries)} artifacts ===")
 
+    return {
+        "version": 1,
+        "artifacts": entries,
+    }
+
+
+def _populate_and_hash(
+    project_dir: Path, config: Config, temp_home: Path, coursier_cache: Path, env: dict
+) -> list[dict]:
+    """Run phase 1 (populate the caches) and phase 2 (hash artifacts), returning sorted entries."""
     # Run shell commands before sbt (e.g., code generators)
     for i, cmd in enumerate(config.shell_commands, 1):
         # Expand environment variables in command arguments
         expanded_cmd = [os.path.expandvars(arg.replace("$HOME", env["HOME"])) for arg in cmd]
         log(f"Running shell command ({i}/{len(config.shell_commands)}): {' '.join(expanded_cmd)}")
-        result = subprocess.run(
-            expanded_cmd,
-            env=env,
-            cwd=project_dir,
-            capture_output=True,
-            text=True,
-        )
-        if result.returncode != 0:
-            log(f"Shell command failed:\n{result.stdout}\n{result.stderr}")
+        returncode, output = _run_streaming(expanded_cmd, env, project_dir)
+        if returncode != 0:
+            log("Shell command failed:\n" + "\n".join(output))
             raise RuntimeError(f"Shell command failed: {' '.join(expanded_cmd)}")
 
     # Run sbt commands from config
     for i, sbt_run in enumerate(config.sbt_runs, 1):
-        cmd = ["sbt", "--batch"] + sbt_run.args
-        log(f"Running sbt ({i}/{len(config.sbt_runs)}): {' '.join(cmd)}")
-        result = subprocess.run(
-            cmd,
-            env=env,
-            cwd=project_dir,
-            capture_output=True,
-            text=True,
-        )
-        # Log launcher messages
-        for line in result.stderr.split('\n'):
-            if '[launcher]' in line:
-                log(f"[info] {line.strip()}")
-        if result.returncode != 0:
-            log(f"sbt failed:\n{result.stdout}\n{result.stderr}")
-            raise RuntimeError(f"sbt command failed: {' '.join(cmd)}")
+        log(f"Running sbt ({i}/{len(config.sbt_runs)}): {' '.join(['sbt', '--batch'] + sbt_run.args)}")
+        run_sbt(sbt_run, env, project_dir)
 
     # Fetch compiler-bridge sources (sbt compiles these but doesn't cache the sources)
+    # and any explicitly configured artifacts
     bridges = find_compiler_bridges(coursier_cache)
-    if bridges:
-        fetch_bridge_sources(coursier_cache, bridges, env)
-
-    # Fetch any explicitly configured artifacts
-    fetch_configured_artifacts(coursier_cache, config.fetch_artifacts, env)
+    fetch_extra_artifacts(coursier_cache, bridges, config.fetch_artifacts, env)
 
     log("=== Phase 2: Generating lockfile ===")
 
@@ -403,49 +535,74 @@ def _generate_lockfile_impl(project_dir: Path, config: Config, temp_home: Path)
     ivy_cache = temp_home / ".ivy2" / "cache"
     assert_no_ivy_artifacts(ivy_cache)
 
-    # Find Coursier artifacts
-    coursier_artifacts = find_coursier_artifacts(coursier_cache)
-    log(f"Found {len(coursier_artifacts)} Coursier artifacts")
+    # Process Coursier artifacts (hashing is independent per file, so fan out across threads).
+    # Hashes are not cached across runs: phase 1 downloads into a fresh temporary cache every
+    # time, so stat-based keys (inode, size, mtime) never repeat, and reusing hashes by URL
+    # would hide upstream changes (e.g. re-published snapshots) from the lockfile.
+    https_prefixes = https_path_prefixes(coursier_cache)
+    hashes_by_url: dict[str, Future[str]] = {}
+    found = 0
+    entries = []
+    with ThreadPoolExecutor(max_workers=HASH_WORKERS) as executor:
+        # Hash artifacts while the cache is still being walked. Deduplicate by URL before
+        # hashing (cs fetch and sbt may cache to different paths)
+        for path in iter_coursier_artifacts(coursier_cache):
+            found += 1
+            url = path_to_url(path, https_prefixes)
+            if url not in hashes_by_url:
+                hashes_by_url[url] = executor.submit(compute_sha256, path)
 
-    if not coursier_artifacts:
-        raise AssertionError("No Coursier artifacts found - sbt may have failed to download dependencies")
+        log(f"Found {found} Coursier artifacts")
 
-    # Process Coursier artifacts
-    entries = []
-    for i, path in enumerate(coursier_artifacts, 1):
-        url = path_to_url(path, coursier_cache)
-        sha256 = compute_sha256(path)
-        entries.append({
-            "url": url,
-            "sha256": sha256,
-        })
-
-        if i % 100 == 0:
-            log(f"  Processed {i} artifacts...")
-
-    # Deduplicate entries (cs fetch and sbt may cache to different paths)
-    seen_urls = set()
-    unique_entries = []
-    for entry in entries:
-        if entry["url"] not in seen_urls:
-            seen_urls.add(entry["url"])
-            unique_entries.append(entry)
-    entries = unique_entries
+        if not found:
+            raise AssertionError("No Coursier artifacts found - sbt may have failed to download dependencies")
+
+        for i, (url, pending_hash) in enumerate(hashes_by_url.items(), 1):
+            entries.append({
+                "url": url,
+                "sha256": pending_hash.result(),
+            })
+
+            if i % 100 == 0:
+                log(f"  Processed {i} artifacts...")
 
     # Sort entries by URL for deterministic output
     entries.sort(key=lambda e: e["url"])
 
-    log(f"=== Done! Processed {len(entries)} artifacts ===")
-
-    return {
-        "version": 1,
-        "artifacts": entries,
-    }
+    return entries
 
 
 DEFAULT_LOCKFILE_NAME = "deps.lock.json"
 
 
+def write_lockfile(lockfile: dict, output: TextIO) -> None:
+    """Write the lockfile exactly as json.dumps(lockfile, indent=2) plus a trailing newline.
+
+    json.dumps switches to its pure-Python encoder whenever indent is set. The lockfile
+    layout is fixed, so only the individual values go through the C encoder here, and
+    the document is streamed entry by entry instead of built in memory.
+    """
+    write = output.write
+
+    write(
+        "{\n"
+        f'  "version": {json.dumps(lockfile["version"])},\n'
+        '  "artifacts": ['
+    )
+
+    separator = "\n"
+    for artifact in lockfile["artifacts"]:
+        write(
+            f"{separator}    {{\n"
+            f'      "url": {json.dumps(artifact["url"])},\n'
+            f'      "sha256": {json.dumps(artifact["sha256"])}\n'
+            "    }"
+        )
+        separator = ",\n"
+
+    write("\n  ]\n}\n" if lockfile["artifacts"] else "]\n}\n")
+
+
 def main() -> None:
     parser = argparse.ArgumentParser(
         description="Generate lockfile for sbt projects"
@@ -477,13 +634,20 @@ def main() -> None:
     project_dir = Path.cwd()
     lockfile = generate_lockfile(project_dir, config, keep_temp=args.keep_temp)
 
-    lockfile_json = json.dumps(lockfile, indent=2) + "\n"
-
     if not args.dry_run:
-        args.output.write_text(lockfile_json)
+        # Write next to the output and rename over it, so a failed or interrupted
+        # write never leaves a truncated lockfile behind
+        tmp_output = args.output.with_name(f".{args.output.name}.{os.getpid()}.tmp")
+        try:
+            with open(tmp_output, "w") as output:
+                write_lockfile(lockfile, output)
+            os.replace(tmp_output, args.output)
+        except BaseException:
+            tmp_output.unlink(missing_ok=True)
+            raise
         log(f"Wrote lockfile to {args.output}")
 
-    sys.stdout.write(lockfile_json)
+    write_lockfile(lockfile, sys.stdout)
 
 
 if __name__ == "__main__":